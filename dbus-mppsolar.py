@@ -7,39 +7,125 @@ via VRM of the features.
 """
 VERSION = 'v0.2' 
 
-from gi.repository import GLib
-import platform
 import argparse
 import logging
 import sys
 import os
-import subprocess as sp
-import json
-from enum import Enum
-import datetime
-import dbus
-import dbus.service
+import re
 
 logging.basicConfig(level=logging.WARNING)
 
-# our own packages
-sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'velib_python'))
-from vedbus import VeDbusService, VeDbusItemExport, VeDbusItemImport
-
 # Workarounds for some inverter specific problem I saw
 INVERTER_OFF_ASSUME_BYPASS = True
 GUESS_AC_CHARGING = True
 
 # Should we import and call manually, to use our version
 USE_SYSTEM_MPPSOLAR = False
-if USE_SYSTEM_MPPSOLAR:
-    try:
+
+# Heavy imports, only needed by the service itself (not by --probe)
+def importServiceModules():
+    global GLib, platform, sp, json, Enum, datetime, dbus, SystemBus, SessionBus
+    global VeDbusService, VeDbusItemExport, VeDbusItemImport
+    global USE_SYSTEM_MPPSOLAR, mppsolar
+    from gi.repository import GLib
+    import platform
+    import subprocess as sp
+    import json
+    from enum import Enum
+    import datetime
+    import dbus
+    import dbus.service
+
+    # Allow to have multiple DBUS connections
+    class SystemBus(dbus.bus.BusConnection):
+        def __new__(cls):
+            return dbus.bus.BusConnection.__new__(cls, dbus.bus.BusConnection.TYPE_SYSTEM) 
+    class SessionBus(dbus.bus.BusConnection):
+        def __new__(cls):
+            return dbus.bus.BusConnection.__new__(cls, dbus.bus.BusConnection.TYPE_SESSION)
+
+    # our own packages
+    sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'velib_python'))
+    from vedbus import VeDbusService, VeDbusItemExport, VeDbusItemImport
+
+    if USE_SYSTEM_MPPSOLAR:
+        try:
+            import mppsolar
+        except:
+            USE_SYSTEM_MPPSOLAR = False
+    if not USE_SYSTEM_MPPSOLAR:
+        sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'mpp-solar'))
         import mppsolar
-    except:
-        USE_SYSTEM_MPPSOLAR = FALSE
-if not USE_SYSTEM_MPPSOLAR:
-    sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'mpp-solar'))
-    import mppsolar
+
+def parseArgs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baudrate","-b", default=2400, type=int)
+    parser.add_argument("--serial","-s", required=True, type=str)
+    parser.add_argument("--probe", action="store_true",
+                        help="Only check that an inverter answers on the serial and exit (0 found, 1 not found)")
+    parser.add_argument("--probe-timeout", default=0.3, type=float,
+                        help="Seconds to wait for the inverter answer on each probe attempt")
+    return parser.parse_args()
+
+# CRC used by the PI protocols (CRC-16/XMODEM, avoiding the '(', CR and LF bytes)
+def crcPI(data):
+    crc = 0
+    for b in data:
+        crc ^= b << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    crc = [(crc >> 8) & 0xFF, crc & 0xFF]
+    return bytes([c + 1 if c in (0x28, 0x0d, 0x0a) else c for c in crc])
+
+# Commands used to probe the inverter, QPI for PI30 ones, ^P003PI for PI17
+PROBE_COMMANDS = [b'QPI' + crcPI(b'QPI') + b'\r', b'^P003PI\r']
+
+# Validate a probe answer, returns the protocol id or None if not an inverter
+def parseProbeResponse(response):
+    if not response.endswith(b'\r'):
+        return None
+    # PI17: ^D<nnn length><data><crc>
+    if re.match(rb'\^D\d{3}', response):
+        if int(response[2:5]) != len(response) - 5 or crcPI(response[:-3]) != response[-3:-1]:
+            return None
+        match = re.fullmatch(rb'\d{2}', response[5:-3])
+        return 'PI' + match.group(0).decode() if match else None
+    # PI30: (<data><crc>
+    if len(response) < 4 or not response.startswith(b'('):
+        return None
+    if crcPI(response[:-3]) != response[-3:-1]:
+        return None
+    match = re.fullmatch(rb'\((PI\d{2})', response[:-3])
+    if not match: # NAK or garbage
+        return None
+    return match.group(1).decode()
+
+# Fast check of the serial, only needs pyserial so we do not pay for loading
+# dbus/velib/mpp-solar on every tty that is not an inverter
+def probe(port, baudrate, timeout, attempts=2):
+    try:
+        import serial
+        with serial.Serial(port, baudrate, timeout=timeout, write_timeout=timeout) as s:
+            for _ in range(attempts):
+                for command in PROBE_COMMANDS:
+                    s.reset_input_buffer()
+                    s.write(command)
+                    response = s.read_until(b'\r')
+                    if not response:
+                        # Nothing is listening, no point in trying anything else
+                        logging.warning(f"Probe of {port} got no response")
+                        return None
+                    protocol = parseProbeResponse(response)
+                    if protocol:
+                        logging.warning(f"Probe of {port} found inverter protocol {protocol}")
+                        return protocol
+                    logging.debug(f"Probe of {port} got no valid response to {command}: {response}")
+    except Exception as e:
+        logging.warning(f"Probe of {port} failed: {e}")
+        return None
+    logging.warning(f"Probe of {port} found no inverter")
+    return None
 
 # Inverter commands to read from the serial
 def runInverterCommands(commands, protocol="PI30"):
@@ -81,31 +167,27 @@ def isNaN(num):
     return num != num
 
 
-# Allow to have multiple DBUS connections
-class SystemBus(dbus.bus.BusConnection):
-    def __new__(cls):
-        return dbus.bus.BusConnection.__new__(cls, dbus.bus.BusConnection.TYPE_SYSTEM) 
-class SessionBus(dbus.bus.BusConnection):
-    def __new__(cls):
-        return dbus.bus.BusConnection.__new__(cls, dbus.bus.BusConnection.TYPE_SESSION)
 def dbusconnection():
     return SessionBus() if 'DBUS_SESSION_BUS_ADDRESS' in os.environ else SystemBus()
 
 # Our MPP solar service that conencts to 2 dbus services (multi & vebus)
 class DbusMppSolarService(object):
-    def __init__(self, tty, deviceinstance, productname='MPPSolar', connection='MPPSolar interface'):
+    def __init__(self, tty, deviceinstance, productname='MPPSolar', connection='MPPSolar interface', protocol=None):
         self._tty = tty
         self._queued_updates = []
 
-        # Try to get the protocol version of the inverter
-        try:
-            self._invProtocol = runInverterCommands(['QPI'])[0].get('protocol_id', 'PI30')
-        except:
+        # Try to get the protocol version of the inverter, unless the probe already did
+        if protocol:
+            self._invProtocol = protocol
+        else:
             try:
-                self._invProtocol = runInverterCommands(['PI'])[0].get('protocol_id', 'PI17')
+                self._invProtocol = runInverterCommands(['QPI'])[0].get('protocol_id', 'PI30')
             except:
-                logging.error("Protocol detection error, will probably fail now in the next steps")
-                self._invProtocol = "QPI"
+                try:
+                    self._invProtocol = runInverterCommands(['PI'])[0].get('protocol_id', 'PI17')
+                except:
+                    logging.error("Protocol detection error, will probably fail now in the next steps")
+                    self._invProtocol = "QPI"
         
         # Refine the protocol received, it may be the inverter is lying
         if self._invProtocol == 'PI30':
@@ -608,17 +690,21 @@ class DbusMppSolarService(object):
         return True # accept the change
 
 def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--baudrate","-b", default=2400, type=int)
-    parser.add_argument("--serial","-s", required=True, type=str)
     global args
-    args = parser.parse_args()
+    args = parseArgs()
+
+    # Exit early (and cheap) if there is no inverter, so serial-starter moves on
+    protocol = probe(args.serial, args.baudrate, args.probe_timeout)
+    if args.probe or protocol is None:
+        sys.exit(0 if protocol else 1)
+
+    importServiceModules()
 
     from dbus.mainloop.glib import DBusGMainLoop
     # Have a mainloop, so we can send/receive asynchronous calls to and from dbus
     DBusGMainLoop(set_as_default=True)
 
-    mppservice = DbusMppSolarService(tty=args.serial.strip("/dev/"), deviceinstance=0)
+    mppservice = DbusMppSolarService(tty=args.serial.strip("/dev/"), deviceinstance=0, protocol=protocol)
     logging.warning('Created service & connected to dbus, switching over to GLib.MainLoop() (= event based)')
 
     global mainloop
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import importlib.util
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+# dbus-mppsolar.py is not an importable name, load it by path
+spec = importlib.util.spec_from_file_location("dbus_mppsolar", os.path.join(os.path.dirname(__file__), "dbus-mppsolar.py"))
+dbus_mppsolar = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(dbus_mppsolar)
+
+def frame(data):
+    return data + dbus_mppsolar.crcPI(data) + b'\r'
+
+# Stand-in for pyserial, answers each read_until with the next canned response
+class FakeSerial(object):
+    responses = []
+    error = None
+    instances = []
+
+    def __init__(self, port, baudrate, timeout=None, write_timeout=None):
+        if FakeSerial.error:
+            raise FakeSerial.error
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.writes = []
+        self.resets = 0
+        self.responses = list(FakeSerial.responses)
+        FakeSerial.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def reset_input_buffer(self):
+        self.resets += 1
+
+    def write(self, data):
+        self.writes.append(data)
+
+    def read_until(self, expected):
+        return self.responses.pop(0) if self.responses else b''
+
+class FakeSerialTestCase(unittest.TestCase):
+    def setUp(self):
+        FakeSerial.responses = []
+        FakeSerial.error = None
+        FakeSerial.instances = []
+        patcher = mock.patch.dict(sys.modules, {'serial': types.SimpleNamespace(Serial=FakeSerial)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+class TestProbe(unittest.TestCase):
+    def test_crc(self):
+        self.assertEqual(dbus_mppsolar.crcPI(b'QPI'), b'\xbe\xac')
+        self.assertEqual(dbus_mppsolar.crcPI(b'QVFW'), b'b\x99')
+        self.assertEqual(dbus_mppsolar.PROBE_COMMANDS[0], b'QPI\xbe\xac\r')
+
+    def test_pi30(self):
+        self.assertEqual(dbus_mppsolar.parseProbeResponse(b'(PI30\x9a\x0b\r'), 'PI30')
+
+    def test_pi17(self):
+        self.assertEqual(dbus_mppsolar.parseProbeResponse(frame(b'^D00517')), 'PI17')
+
+    def test_pi17_bad_crc(self):
+        self.assertIsNone(dbus_mppsolar.parseProbeResponse(b'^D00517\x00\x00\r'))
+
+    def test_pi17_bad_length(self):
+        self.assertIsNone(dbus_mppsolar.parseProbeResponse(frame(b'^D00917')))
+
+    def test_bad_crc(self):
+        self.assertIsNone(dbus_mppsolar.parseProbeResponse(b'(PI30\x00\x00\r'))
+
+    def test_short(self):
+        self.assertIsNone(dbus_mppsolar.parseProbeResponse(b''))
+        self.assertIsNone(dbus_mppsolar.parseProbeResponse(b'(\r'))
+
+    def test_no_cr(self):
+        self.assertIsNone(dbus_mppsolar.parseProbeResponse(b'(PI30\x9a\x0b'))
+
+    def test_nak(self):
+        self.assertIsNone(dbus_mppsolar.parseProbeResponse(frame(b'(NAK')))
+
+    def test_not_protocol(self):
+        self.assertIsNone(dbus_mppsolar.parseProbeResponse(frame(b'(230.0 50.0')))
+
+class TestProbeSerial(FakeSerialTestCase):
+    def probe(self):
+        return dbus_mppsolar.probe('/dev/ttyUSB0', 2400, 0.3)
+
+    def test_found(self):
+        FakeSerial.responses = [b'(PI30\x9a\x0b\r']
+        self.assertEqual(self.probe(), 'PI30')
+        s = FakeSerial.instances[0]
+        self.assertEqual((s.port, s.baudrate, s.timeout), ('/dev/ttyUSB0', 2400, 0.3))
+        self.assertEqual(s.writes, [b'QPI\xbe\xac\r'])
+        self.assertEqual(s.resets, 1)
+
+    def test_silent(self):
+        self.assertIsNone(self.probe())
+        self.assertEqual(FakeSerial.instances[0].writes, [b'QPI\xbe\xac\r'])
+
+    def test_pi17_after_nak(self):
+        FakeSerial.responses = [frame(b'(NAK'), frame(b'^D00517')]
+        self.assertEqual(self.probe(), 'PI17')
+        self.assertEqual(FakeSerial.instances[0].writes, dbus_mppsolar.PROBE_COMMANDS)
+
+    def test_retry_corrupt(self):
+        FakeSerial.responses = [b'(PI30\x00\x00\r', b'\x00\r', b'(PI30\x9a\x0b\r']
+        self.assertEqual(self.probe(), 'PI30')
+        self.assertEqual(FakeSerial.instances[0].resets, 3)
+
+    def test_corrupt(self):
+        FakeSerial.responses = [b'\x00\r'] * 4
+        self.assertIsNone(self.probe())
+        self.assertEqual(len(FakeSerial.instances[0].writes), 4)
+
+    def test_open_error(self):
+        FakeSerial.error = OSError("No such device")
+        self.assertIsNone(self.probe())
+
+class TestMain(FakeSerialTestCase):
+    def main(self, *argv):
+        with mock.patch.object(sys, 'argv', ['dbus-mppsolar.py', '-s', '/dev/ttyUSB0'] + list(argv)), \
+             mock.patch.object(dbus_mppsolar, 'importServiceModules', side_effect=AssertionError("service started")):
+            with self.assertRaises(SystemExit) as cm:
+                dbus_mppsolar.main()
+        return cm.exception.code
+
+    def test_probe_found(self):
+        FakeSerial.responses = [b'(PI30\x9a\x0b\r']
+        self.assertEqual(self.main('--probe'), 0)
+
+    def test_probe_not_found(self):
+        self.assertEqual(self.main('--probe'), 1)
+
+    def test_start_not_found(self):
+        self.assertEqual(self.main(), 1)
+
+if __name__ == "__main__":
+    unittest.main()